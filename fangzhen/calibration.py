@@ -0,0 +1,183 @@
+import os
+import logging
+import time
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from two_stage import (generate_scalefree_network, rumor_spreading_model, setup_logger,
+                       OFFICIAL_MULTIPLIERS, OPINION_MULTIPLIERS)
+from survey_profiles import list_combos, load_respondent_profiles
+
+# 待校准参数: 五个转移概率 + 官方/意见领袖的两组影响倍数
+FIT_KEYS = ('alpha_i', 'alpha_r', 'alpha_d', 'beta_d', 'delta',
+            'official_r', 'official_d', 'opinion_r', 'opinion_d')
+BOUNDS = [(1e-3, 1.0)] * 5 + [(1.0, 3.0)] * 4
+# 易感者的三个互斥转移 (alpha_i, alpha_r, alpha_d) 之和不超过1 (超过后累积阈值饱和, alpha_d 失去作用)
+EXCLUSIVE = [FIT_KEYS.index(key) for key in ('alpha_i', 'alpha_r', 'alpha_d')]
+
+# 李克特7级量表中 ">=5" 对应的归一化阈值
+AGREE = 4 / 6
+
+def survey_outcome_shares(profiles):
+    """将问卷回答归为辟谣后的最终状态，返回 (I, D, R) 比例
+
+    I: 看过辟谣后仍相信且愿意传播谣言;
+    D: 不再相信且愿意分享辟谣信息;
+    R: 其余 (不再传播)。
+    是否仍相信优先取观点变化题 (0/1级为仍相信), 未作答者按辟谣后的可信度判断。
+    """
+    change = profiles['change'].to_numpy(dtype=float)
+    believes = np.where(np.isnan(change), profiles['belief1'].to_numpy() >= AGREE, change <= 1)
+    spreading = believes & (profiles['share1'].to_numpy() >= AGREE)
+    debunking = ~believes & (profiles['debunk_share'].to_numpy() >= AGREE)
+    shares = np.array([spreading.mean(), debunking.mean()])
+    return np.append(shares, 1 - shares.sum())
+
+def replicate_network(indptr, indices, replicates):
+    """将同一网络复制为互不相连的多份, 使多次重复模拟在一次向量化运行中完成"""
+    N = len(indptr) - 1
+    E = len(indices)
+    offsets = np.arange(replicates)
+    rep_indptr = np.concatenate([[0], (indptr[1:] + E * offsets[:, None]).ravel()])
+    rep_indices = (indices + N * offsets[:, None]).ravel()
+    return rep_indptr, rep_indices
+
+def replicate_seed_selector(n, replicates, D0, n_official):
+    """按份选种: 每份网络内按度从高到低各选 D0 个易感节点 (与单份运行的默认选种一致)
+
+    返回顺序为各份的官方辟谣者在前、意见领袖在后, 使合并图的前 replicates*n_official 个恰为官方辟谣者。
+    """
+    def select(indptr, indices, states, k):
+        degrees = np.diff(indptr)
+        official, opinion = [], []
+        for r in range(replicates):
+            nodes = np.flatnonzero(states[r * n:(r + 1) * n] == 1) + r * n
+            chosen = nodes[np.argsort(-degrees[nodes], kind='stable')][:D0]
+            official.append(chosen[:n_official])
+            opinion.append(chosen[n_official:])
+        return np.concatenate(official + opinion)
+
+    return select
+
+def make_simulator(base_config, replicates=8, seed=0):
+    """返回带记忆缓存的模拟函数 simulate(params) -> 暴露节点的最终归属 (I, D, R) 比例
+
+    模型中传播者与辟谣者最终都会恢复, 因此按节点的经历归类 (与问卷的"看过辟谣后的态度"对应):
+    曾被转化为辟谣者记为D, 否则曾传播谣言记为I, 其余被波及 (末态非S) 的节点记为R;
+    初始的官方/领袖辟谣者不计入。
+
+    公共随机数: 网络只生成一次, 每次评估使用同一网络与同一随机种子; 模型中每次判定的随机数
+    由 (时间步, 节点, 邻居) 决定, 参数不同导致状态不同时其余判定仍使用相同的随机数,
+    目标函数随参数近似连续变化; replicates 份网络拼成一个不相连的大图批量运行,
+    每份各有 I0 个初始传播者, 并各自按度选出 D0 个辟谣者 (官方 round(D0*official_ratio) 个)。
+    相同参数 (四舍五入到4位小数) 的结果直接从缓存返回, 可在多个组合的校准间共享。
+    """
+    logger = setup_logger()
+    N, I0, D0 = base_config["N"], base_config["I0"], base_config["D0"]
+    rng = np.random.default_rng(seed)
+    network = replicate_network(*generate_scalefree_network(N, base_config["m"], logger, rng), replicates)
+    spreaders = np.concatenate([rng.choice(N, I0, replace=False) + r * N for r in range(replicates)])
+    n_official = round(D0 * base_config["official_ratio"])
+    config = {k: v for k, v in base_config.items() if k not in ('official_mult', 'opinion_mult')}
+    # 合并图中的官方占比取 n_official/D0, 使 round(replicates*D0*占比) 恰为每份 n_official 个之和
+    config.update(N=N * replicates, I0=I0 * replicates, D0=D0 * replicates, official_ratio=n_official / D0 if D0 else 0.0,
+                  initial_spreaders=spreaders, seed_selector=replicate_seed_selector(N, replicates, D0, n_official))
+    cache = {}
+
+    def simulate(params):
+        key = tuple(np.round(params, 4))
+        if key not in cache:
+            values = dict(zip(FIT_KEYS, key))
+            logging.disable(logging.INFO)
+            try:
+                St, It, Dt, Rt, final = rumor_spreading_model(
+                    **{**config, **{k: values[k] for k in FIT_KEYS[:5]}},
+                    official_mult=(values['official_r'], values['official_d']),
+                    opinion_mult=(values['opinion_r'], values['opinion_d']),
+                    seed=seed, network=network, return_final=True)
+            finally:
+                logging.disable(logging.NOTSET)
+            debunked = final["debunker_types"] == 3
+            spread = final["ever_spread"] & ~debunked
+            exposed = max(np.sum((final["states"] != 1) & np.isin(final["debunker_types"], (0, 3))), 1)
+            counts = np.array([spread.sum(), debunked.sum()]) / exposed
+            cache[key] = np.append(counts, 1 - counts.sum())
+        return cache[key]
+
+    simulate.cache = cache
+    return simulate
+
+def feasible(x):
+    """参数是否满足互斥转移之和不超过1"""
+    return np.sum(np.asarray(x)[..., EXCLUSIVE], axis=-1) <= 1
+
+def candidate_points(n_starts, seed=0):
+    """在参数边界内按对数均匀抽取初筛点, 只保留满足互斥约束的点 (固定种子, 各组合共用同一批点以命中缓存)"""
+    rng = np.random.default_rng(seed)
+    low, high = np.log(np.array(BOUNDS)).T
+    points = np.empty((0, len(BOUNDS)))
+    while len(points) < n_starts:
+        draws = np.exp(low + (high - low) * rng.random((n_starts, len(BOUNDS))))
+        points = np.vstack([points, draws[feasible(draws)]])
+    return points[:n_starts]
+
+def calibrate(combo, base_config, simulate=None, ridge=1e-3, n_starts=64, maxiter=300, **simulator_options):
+    """校准单个谣言-辟谣组合, 使模拟的最终 (I, D, R) 比例贴近问卷结果
+
+    目标函数为比例误差平方和, 加上对初始参数对数偏离的岭惩罚 (9个参数对3个目标, 需要正则化);
+    alpha_i + alpha_r + alpha_d 超过1的点不做模拟, 直接返回随越界量增大的惩罚值,
+    拟合结果因此可直接用于 survey_profiles.profile_rates。
+    先在初筛点与初始参数中取目标函数最小者, 再以 Nelder-Mead 局部细化。
+    返回 (拟合参数字典, 目标比例, 模拟比例)。
+    """
+    simulate = simulate or make_simulator(base_config, **simulator_options)
+    target = survey_outcome_shares(load_respondent_profiles(combo))
+    x0 = np.array([base_config[k] for k in FIT_KEYS[:5]]
+                  + list(base_config.get('official_mult', OFFICIAL_MULTIPLIERS))
+                  + list(base_config.get('opinion_mult', OPINION_MULTIPLIERS)), dtype=float)
+
+    if not feasible(x0):
+        raise ValueError("初始参数的 alpha_i + alpha_r + alpha_d 不能超过1")
+
+    def loss(x):
+        x = np.round(x, 4)  # 与模拟缓存及输出的精度一致, 保证四舍五入后仍满足约束
+        if not feasible(x):
+            return 1e3 * np.sum(x[EXCLUSIVE])
+        err = simulate(x) - target
+        return err @ err + ridge * np.sum(np.log(x / x0) ** 2)
+
+    starts = np.vstack([x0, candidate_points(n_starts)])
+    best = starts[np.argmin([loss(x) for x in starts])]
+    simplex = np.vstack([best] + [best * np.where(np.arange(len(best)) == i, 1.2, 1.0) for i in range(len(best))])
+    simplex = np.clip(simplex, *np.array(BOUNDS).T)
+    result = minimize(loss, best, method='Nelder-Mead', bounds=BOUNDS,
+                      options={'maxiter': maxiter, 'xatol': 1e-3, 'fatol': 1e-5, 'initial_simplex': simplex})
+    fitted = dict(zip(FIT_KEYS, np.round(result.x, 4)))
+    return fitted, target, simulate(result.x)
+
+def calibrate_all(base_config, combos=None, **simulator_options):
+    """依次校准所有组合 (共享同一模拟缓存)，返回汇总表"""
+    simulate = make_simulator(base_config, **simulator_options)
+    rows = []
+    for combo in combos or list_combos():
+        start_time = time.time()
+        fitted, target, simulated = calibrate(combo, base_config, simulate)
+        rows.append({'组合': combo, **fitted,
+                     '问卷I': target[0], '问卷D': target[1], '问卷R': target[2],
+                     '模拟I': simulated[0], '模拟D': simulated[1], '模拟R': simulated[2]})
+        print(f"{combo} 校准完成，耗时: {time.time() - start_time:.1f}秒 (缓存 {len(simulate.cache)} 组参数)")
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    # --- 校准配置 (N为单份网络规模, 比例与网络规模基本无关) ---
+    config = {
+        "N": 5000, "m": 2, "I0": 10, "T": 50, "Td": 10, "D0": 10,
+        "official_ratio": 0.1, "official_layers": 3, "opinion_layers": 2,
+        "alpha_i": 0.1, "alpha_r": 0.8, "alpha_d": 0.1, "beta_d": 0.6, "delta": 0.5
+    }
+
+    results = calibrate_all(config, replicates=8, seed=0)
+    output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration_results.csv')
+    results.to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"校准结果已保存到 {output_file}")
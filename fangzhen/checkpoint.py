@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+def network_fingerprint(indptr, indices):
+    """计算CSR网络结构的指纹, 用于缓存键与断点记录"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(indptr).tobytes())
+    h.update(np.ascontiguousarray(indices).tobytes())
+    return h.hexdigest()
+
+def _describe(value):
+    """标量与短数组原样记录, 逐节点数组记为形状与哈希 (不复制数组)"""
+    array = np.asarray(value)
+    if array.size <= 16:
+        return array.astype(float).tolist()
+    digest = hashlib.blake2b(np.ascontiguousarray(array).data, digest_size=16).hexdigest()
+    return f"{array.dtype}{array.shape}:{digest}"
+
+def run_signature(**params):
+    """将运行参数整理为可写入断点并比较的字典
+
+    倍数参数为 (标量或逐节点数组) 组成的元组, 逐个元素分别记录。
+    """
+    signature = {}
+    for key, value in params.items():
+        if isinstance(value, (tuple, list)):
+            signature[key] = [_describe(element) for element in value]
+        else:
+            signature[key] = _describe(value)
+    return json.loads(json.dumps(signature))
+
+def _atomic_savez(path, **arrays):
+    """先写入同目录临时文件再原子替换, 中途崩溃不会留下损坏的文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_network(directory, indptr, indices):
+    """将网络缓存为 network_<指纹>.npz (已存在则跳过)，返回文件名与指纹"""
+    fingerprint = network_fingerprint(indptr, indices)
+    filename = f"network_{fingerprint}.npz"
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        _atomic_savez(path, indptr=indptr, indices=indices)
+    return filename, fingerprint
+
+def load_network(directory, filename, fingerprint):
+    """读取缓存的网络并校验指纹"""
+    with np.load(os.path.join(directory, filename)) as data:
+        indptr, indices = data['indptr'], data['indices']
+    if network_fingerprint(indptr, indices) != fingerprint:
+        raise ValueError(f"网络缓存文件 {filename} 与断点记录的指纹不一致")
+    return indptr, indices
+
+def save_checkpoint(path, t, rng, indptr, indices, signature=None, **arrays):
+    """保存第t步结束时的模拟状态: 状态数组、随机数生成器状态、当前步、网络引用与运行参数
+
+    网络本身只在断点目录中缓存一份, 断点文件中只记录其文件名与指纹。
+    signature 为 run_signature 生成的运行参数, 恢复时用于校验。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    network_file, fingerprint = save_network(directory, indptr, indices)
+    _atomic_savez(path, t=t, rng_state=json.dumps(rng.bit_generator.state),
+                  signature=json.dumps(signature or {}, ensure_ascii=False),
+                  network_file=network_file, network_fingerprint=fingerprint, **arrays)
+
+def load_checkpoint(path, signature=None):
+    """读取断点, 返回 (t, rng, (indptr, indices), 其余数组字典)
+
+    给定 signature 时与断点记录的运行参数逐项比较, 不一致则抛出 ValueError。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    saved_signature = json.loads(str(arrays.pop('signature')))
+    if signature is not None:
+        mismatched = sorted(key for key in set(signature) | set(saved_signature)
+                            if signature.get(key) != saved_signature.get(key))
+        if mismatched:
+            raise ValueError(f"断点 {path} 的运行参数与本次不一致: {', '.join(mismatched)}")
+    state = json.loads(str(arrays.pop('rng_state')))
+    rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    rng.bit_generator.state = state
+    network = load_network(directory, str(arrays.pop('network_file')), str(arrays.pop('network_fingerprint')))
+    return int(arrays.pop('t')), rng, network, arrays
@@ -0,0 +1,208 @@
+import os
+import logging
+import time
+import numpy as np
+
+from two_stage import neighbor_edges, OFFICIAL_MULTIPLIERS, OPINION_MULTIPLIERS
+from checkpoint import network_fingerprint
+
+logger = logging.getLogger('RumorModel')
+
+# 已采样的反向可达集 (按网络指纹与采样参数缓存, 同一网络只采样一次)
+_RR_CACHE = {}
+
+def _fill_by_degree(indptr, available, chosen, k):
+    """候选不足k个时, 按度从高到低补足 (与原始选种规则一致)"""
+    if len(chosen) >= k:
+        return np.asarray(chosen[:k], dtype=np.int64)
+    remaining = available.copy()
+    remaining[chosen] = False
+    candidates = np.flatnonzero(remaining)
+    extra = candidates[np.argsort(-np.diff(indptr)[candidates], kind='stable')][:k - len(chosen)]
+    return np.concatenate([np.asarray(chosen, dtype=np.int64), extra])
+
+def degree_discount_seeds(indptr, indices, available, k, p=0.1):
+    """度折扣启发式 (Chen et al. 2009): 已选种子的邻居按 d - 2t - (d - t)tp 折减得分"""
+    degrees = np.diff(indptr).astype(float)
+    selected_neighbors = np.zeros(len(degrees))
+    score = np.where(available, degrees, -np.inf)
+    seeds = []
+    for _ in range(min(k, int(available.sum()))):
+        v = int(np.argmax(score))
+        seeds.append(v)
+        score[v] = -np.inf
+        nbrs = indices[indptr[v]:indptr[v + 1]]
+        selected_neighbors[nbrs] += 1
+        t, d = selected_neighbors[nbrs], degrees[nbrs]
+        score[nbrs] = np.where(np.isfinite(score[nbrs]), d - 2 * t - (d - t) * t * p, -np.inf)
+    return np.asarray(seeds, dtype=np.int64)
+
+def core_numbers(indptr, indices):
+    """k-核分解: 每轮同时剥离当前度不超过k的全部节点"""
+    N = len(indptr) - 1
+    degrees = np.diff(indptr).copy()
+    core = np.zeros(N, dtype=np.int64)
+    alive = np.ones(N, dtype=bool)
+    k = 0
+    while alive.any():
+        k = max(k, int(degrees[alive].min()))
+        peel = np.flatnonzero(alive & (degrees <= k))
+        while peel.size:
+            core[peel] = k
+            alive[peel] = False
+            degrees -= np.bincount(indices[neighbor_edges(indptr, peel)], minlength=N)
+            peel = np.flatnonzero(alive & (degrees <= k))
+    return core
+
+def kcore_seeds(indptr, indices, available, k):
+    """按核数从高到低选种, 同核数内按度排序 (m相同的BA网络中几乎所有节点核数都是m, 此时退化为按度选种)"""
+    candidates = np.flatnonzero(available)
+    core = core_numbers(indptr, indices)[candidates]
+    degrees = np.diff(indptr)[candidates]
+    return candidates[np.lexsort((-degrees, -core))][:k]
+
+def sample_rr_sets(indptr, indices, n_sets, p, max_hops, seed=0):
+    """批量采样反向可达集 (独立级联, 每条边以概率p生效, 最多max_hops层)
+
+    返回 (roots, rr_ptr, rr_nodes): 第j个集合的节点为 rr_nodes[rr_ptr[j]:rr_ptr[j+1]]。
+    网络为无向图, 反向传播与正向相同; 所有集合逐层同时扩展, 以 集合编号*N+节点 去重。
+    """
+    N = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    roots = rng.integers(N, size=n_sets)
+    visited = np.arange(n_sets, dtype=np.int64) * N + roots
+    frontier_set, frontier_node = np.arange(n_sets, dtype=np.int64), roots
+    for hop in range(max_hops):
+        if frontier_node.size == 0:
+            break
+        edges = neighbor_edges(indptr, frontier_node)
+        edge_set = np.repeat(frontier_set, np.diff(indptr)[frontier_node])
+        live = rng.random(len(edges)) < p
+        keys = np.sort(edge_set[live] * N + indices[edges[live]])
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+        keys = keys[~np.isin(keys, visited, assume_unique=True)]
+        visited = np.concatenate([visited, keys])
+        frontier_set, frontier_node = keys // N, keys % N
+
+    visited.sort()
+    rr_ptr = np.zeros(n_sets + 1, dtype=np.int64)
+    np.cumsum(np.bincount(visited // N, minlength=n_sets), out=rr_ptr[1:])
+    return roots, rr_ptr, visited % N
+
+def cached_rr_sets(indptr, indices, n_sets=100_000, p=0.1, max_hops=3, seed=0, cache_dir=None,
+                   max_entries=20_000_000):
+    """获取反向可达集: 先查内存缓存, 再查 cache_dir 下的 .npz 文件, 都没有时才采样
+
+    边概率较大时集合规模随层数急剧增长: 先采样少量集合估计平均大小,
+    使集合总条目数不超过 max_entries (必要时减少集合数, 保证选种仍在数秒内完成)。
+    """
+    key = (network_fingerprint(indptr, indices), n_sets, p, max_hops, seed, max_entries)
+    if key in _RR_CACHE:
+        return _RR_CACHE[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'rr_{}_{}_{}_{}_{}_{}.npz'.format(*key))
+        if os.path.exists(path):
+            with np.load(path) as data:
+                _RR_CACHE[key] = (data['roots'], data['rr_ptr'], data['rr_nodes'])
+            return _RR_CACHE[key]
+
+    start_time = time.time()
+    pilot = sample_rr_sets(indptr, indices, min(n_sets, 1000), p, max_hops, seed)
+    n_sets = min(n_sets, max(len(pilot[0]), int(max_entries * len(pilot[0]) / max(len(pilot[2]), 1))))
+    rr = sample_rr_sets(indptr, indices, n_sets, p, max_hops, seed)
+    logger.info(f"反向可达集采样完成 ({n_sets}个, 平均大小{len(rr[2]) / n_sets:.1f})，耗时: {time.time() - start_time:.2f}秒")
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, roots=rr[0], rr_ptr=rr[1], rr_nodes=rr[2])
+    _RR_CACHE[key] = rr
+    return rr
+
+def rr_greedy_seeds(rr, available, k, root_weights=None):
+    """在反向可达集上做贪心最大覆盖: 每次选能新覆盖最多 (加权) 集合的节点"""
+    roots, rr_ptr, rr_nodes = rr
+    N = len(available)
+    n_sets = len(roots)
+    set_weights = np.ones(n_sets) if root_weights is None else np.asarray(root_weights, dtype=float)[roots]
+    entry_set = np.repeat(np.arange(n_sets), np.diff(rr_ptr))
+
+    # 节点 -> 所在集合 的倒排索引
+    order = np.argsort(rr_nodes, kind='stable')
+    node_ptr = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rr_nodes, minlength=N), out=node_ptr[1:])
+
+    gain = np.bincount(rr_nodes, weights=set_weights[entry_set], minlength=N)
+    gain[~available] = -np.inf
+    covered = np.zeros(n_sets, dtype=bool)
+    seeds = []
+    for _ in range(min(k, int(available.sum()))):
+        v = int(np.argmax(gain))
+        if gain[v] <= 0:
+            break
+        seeds.append(v)
+        gain[v] = -np.inf
+        sets = entry_set[order[node_ptr[v]:node_ptr[v + 1]]]
+        sets = sets[~covered[sets]]
+        covered[sets] = True
+        entries = neighbor_edges(rr_ptr, sets)
+        gain -= np.bincount(rr_nodes[entries], weights=set_weights[entry_set[entries]], minlength=N)
+    return seeds
+
+def cascade_parameters(alpha_d, beta_d, delta, official_mult=OFFICIAL_MULTIPLIERS, opinion_mult=OPINION_MULTIPLIERS,
+                       official_ratio=0.1, official_layers=3, opinion_layers=2, **unused):
+    """由模型参数推导辟谣级联的边概率 p 与最大层数 max_hops (可直接传入 rumor_spreading_model 的配置字典)
+
+    p: 辟谣者在自身恢复之前把某个邻居转化为辟谣者的概率。每步转化概率 q 取易感邻居 (alpha_d)
+       与传播者邻居 (beta_d) 的平均, 并按官方/领袖倍数以 official_ratio 加权放大 (截断到1);
+       每步恢复概率为 delta, 两者竞争得 p = q / (q + delta - q*delta)。
+    max_hops: 官方/领袖影响范围层数的较大者 (范围之外只按基础概率转化)。
+    逐节点参数取均值。
+    """
+    def boosted(rate, k):
+        mult = official_ratio * np.mean(official_mult[k]) + (1 - official_ratio) * np.mean(opinion_mult[k])
+        return min(np.mean(rate) * mult, 1.0)
+
+    q = (boosted(alpha_d, 1) + boosted(beta_d, 0)) / 2
+    d = float(np.mean(delta))
+    p = q / (q + d - q * d) if q + d > 0 else 0.0
+    return {'p': float(p), 'max_hops': int(max(official_layers, opinion_layers, 1))}
+
+def make_seed_selector(strategy='rr_greedy', p=None, max_hops=None, n_sets=100_000, seed=0, cache_dir=None,
+                       config=None):
+    """返回可传给 rumor_spreading_model(seed_selector=...) 的选种函数
+
+    strategy: 'degree' (原始的最高度选种), 'degree_discount', 'kcore' 或 'rr_greedy'。
+    选种函数签名为 select(indptr, indices, states, k), 返回按优先级排列的易感节点,
+    前 D0_official 个作为官方辟谣者, 其余作为意见领袖。
+    rr_greedy 以仍可能传播谣言的节点 (S/I) 为根加权, 选出辟谣级联期望覆盖最多的种子。
+
+    p (级联边概率, degree_discount 也使用) 与 max_hops (级联层数) 是调节参数:
+    未给出时由 config (rumor_spreading_model 的配置字典) 经 cascade_parameters 推导,
+    config 也未给出时取 p=0.1, max_hops=3。
+    注意各策略优化的是辟谣覆盖而非最终传播规模: 模型中辟谣者与易感邻居接触时同样可能使其转为传播者,
+    BA网络上少数高度节点的影响范围又几乎覆盖全网, 因此各策略与按度选种的最终传播规模通常相差很小。
+    """
+    if strategy not in ('degree', 'degree_discount', 'kcore', 'rr_greedy'):
+        raise ValueError(f"未知的选种策略: {strategy}")
+    derived = cascade_parameters(**config) if config is not None else {'p': 0.1, 'max_hops': 3}
+    p = derived['p'] if p is None else p
+    max_hops = derived['max_hops'] if max_hops is None else max_hops
+
+    def select(indptr, indices, states, k):
+        start_time = time.time()
+        available = states == 1
+        if strategy == 'degree_discount':
+            chosen = degree_discount_seeds(indptr, indices, available, k, p)
+        elif strategy == 'kcore':
+            chosen = kcore_seeds(indptr, indices, available, k)
+        elif strategy == 'rr_greedy':
+            rr = cached_rr_sets(indptr, indices, n_sets, p, max_hops, seed, cache_dir)
+            chosen = rr_greedy_seeds(rr, available, k, root_weights=(states == 1) | (states == 2))
+        else:
+            chosen = []
+        seeds = _fill_by_degree(indptr, available, chosen, k)
+        logger.info(f"选种策略 {strategy} 选出 {len(seeds)} 个辟谣者，耗时: {time.time() - start_time:.2f}秒")
+        return seeds
+
+    return select
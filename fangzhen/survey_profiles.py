@@ -0,0 +1,188 @@
+import os
+import numpy as np
+import pandas as pd
+
+from two_stage import OFFICIAL_MULTIPLIERS, OPINION_MULTIPLIERS
+
+# 按谣言-辟谣组合拆分后的问卷数据 (由 process_data.py 生成)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processed_data')
+
+AGE_COL = '请选择您的年龄范围'
+EDU_COL = '您的最高学历是？'
+CHANNEL_PREFIX = '您主要获取健康信息的渠道是哪些？'
+
+# 渠道题之后各题的位置 (去除作答时长列后, 各组合题目顺序一致)
+QUESTION_POSITIONS = {
+    'belief0': 2,        # 谣言可信度 (1-7)
+    'share0': 3,         # 传播谣言意愿 (1-7)
+    'debunk_cred': 9,    # 辟谣信息可信度 (1-7)
+    'debunk_share': 10,  # 分享辟谣信息意愿 (1-7)
+    'belief1': 12,       # 看过辟谣后的谣言可信度 (1-7)
+    'share1': 13,        # 看过辟谣后的传播意愿 (1-7)
+    'change': 14,        # 观点变化 (仅谣言可信度>=5者作答)
+}
+
+OPINION_CHANGE_LEVELS = {
+    '完全没有变化，仍然相信': 0,
+    '有些动摇，但仍倾向相信': 1,
+    '观点发生明显变化，现在不太相信': 2,
+    '完全改变观点，现在完全不相信': 3,
+}
+
+RATE_KEYS = ('alpha_i', 'alpha_r', 'alpha_d', 'beta_d', 'delta')
+
+def list_combos(data_dir=DATA_DIR):
+    """列出可用的谣言-辟谣组合 (如 '谣言1_辟谣a')"""
+    return sorted(f[:-4] for f in os.listdir(data_dir) if f.endswith('.csv'))
+
+def load_respondent_profiles(combo, data_dir=DATA_DIR):
+    """读取某一谣言-辟谣组合的问卷数据，返回受访者画像
+
+    人口学字段 (age, edu, 各渠道0/1) 原样保留; 李克特题归一化到 [0, 1],
+    观点变化映射为 0-3 级, 未作答者 (本来就不相信谣言) 记为缺失。
+    """
+    df = pd.read_csv(os.path.join(data_dir, f'{combo}.csv'))
+    columns = [col for col in df.columns if '作答时长' not in col]
+    channel_columns = [col for col in columns if col.startswith(CHANNEL_PREFIX)]
+    questions = columns[columns.index(channel_columns[-1]) + 1:]
+
+    profiles = pd.DataFrame({'age': df[AGE_COL], 'edu': df[EDU_COL]})
+    for col in channel_columns:
+        profiles[col.split('-', 1)[-1]] = df[col].fillna(0).astype(int)
+
+    for key, position in QUESTION_POSITIONS.items():
+        answers = df[questions[position]]
+        if key == 'change':
+            profiles[key] = answers.map(OPINION_CHANGE_LEVELS)
+        else:
+            # 李克特7级量表归一化, 缺失值用组合中位数填充
+            answers = pd.to_numeric(answers, errors='coerce')
+            profiles[key] = (answers.fillna(answers.median()) - 1) / 6
+    return profiles
+
+def sampling_weights(profiles, demographic_weights=None):
+    """按目标人口结构 (如 {'age': {'18-30岁': 0.4, ...}}) 计算受访者的事后分层抽样权重"""
+    weights = np.ones(len(profiles))
+    for field, target in (demographic_weights or {}).items():
+        observed = profiles[field].value_counts(normalize=True)
+        ratio = {value: share / observed[value] for value, share in target.items() if value in observed}
+        weights *= profiles[field].map(ratio).fillna(0).to_numpy()
+    if weights.sum() == 0:
+        raise ValueError("目标人口结构与问卷样本没有交集")
+    return weights / weights.sum()
+
+def _logit_tendency(tendency):
+    """倾向压缩到 [0.05, 0.95] 后取logit, 作为逐节点的对数几率偏移 (保持受访者间的次序)"""
+    p = 0.05 + 0.9 * np.clip(tendency, 0, 1)
+    return np.log(p / (1 - p))
+
+def _fit_shift(z, weights, target, others=1.0):
+    """二分求平移量 c, 使 exp(c+z) / (others + exp(c+z)) 的加权均值等于 target
+
+    others=1 时即 sigmoid(c+z); 多个互斥转移联合求解时 others 为其余类别 (含"不转移") 的权重之和。
+    """
+    if target <= 0:
+        return -np.inf
+
+    def mean_rate(c):
+        e = np.exp(c + z)
+        return np.dot(weights, e / (others + e))
+
+    low, high = -50.0, 50.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        low, high = (mid, high) if mean_rate(mid) < target else (low, mid)
+    return (low + high) / 2
+
+def profile_rates(profiles, weights, alpha_i, alpha_r, alpha_d, beta_d, delta,
+                  official_mult=OFFICIAL_MULTIPLIERS, opinion_mult=OPINION_MULTIPLIERS, tol=1e-6):
+    """将受访者回答映射为每位受访者的转移概率与辟谣影响倍数
+
+    每个概率在对数几率上随受访者的相对倾向平移, 平移量使样本加权均值等于全局参数:
+        alpha_i  ~ 谣言可信度 × 传播意愿        (相信并愿意转发)
+        alpha_r  ~ 1 - 谣言可信度              (不信谣言, 直接免疫)
+        alpha_d  ~ 辟谣可信度 × 辟谣分享意愿    (主动加入辟谣)
+        beta_d   ~ 观点变化程度 (未作答者用辟谣后的不信程度)
+        delta    ~ 1 - 辟谣后传播意愿          (失去传播兴趣)
+    易感者的三个互斥转移 (alpha_r, alpha_i, alpha_d) 以多项logit联合求解, 逐节点之和不超过1;
+    其余概率为 sigmoid, 天然位于 (0, 1), 不需要截断。参数越界或无法满足时抛出 ValueError。
+    影响倍数的增幅 (倍数-1) 按辟谣可信度以均值归一化。
+    """
+    change = profiles['change'].to_numpy(dtype=float) / 3
+    change = np.where(np.isnan(change), 1 - profiles['belief1'].to_numpy(), change)
+    tendencies = {
+        'alpha_i': profiles['belief0'].to_numpy() * profiles['share0'].to_numpy(),
+        'alpha_r': 1 - profiles['belief0'].to_numpy(),
+        'alpha_d': profiles['debunk_cred'].to_numpy() * profiles['debunk_share'].to_numpy(),
+        'beta_d': change,
+        'delta': 1 - profiles['share1'].to_numpy(),
+    }
+    base = dict(zip(RATE_KEYS, (alpha_i, alpha_r, alpha_d, beta_d, delta)))
+    if not all(0 <= base[key] <= 1 for key in RATE_KEYS):
+        raise ValueError("转移概率须位于 [0, 1]")
+    exclusive = ('alpha_r', 'alpha_i', 'alpha_d')
+    remainder = 1 - sum(base[key] for key in exclusive)
+    if remainder < -1e-12:
+        raise ValueError("alpha_r + alpha_i + alpha_d 不能超过1")
+
+    # 互斥转移: "不转移"类别权重为1 (三者之和恰为1时为0), 轮流二分求各类别的平移量直到均值收敛
+    z = {key: _logit_tendency(tendencies[key]) for key in exclusive}
+    shifts = dict.fromkeys(exclusive, 0.0)
+    idle = 1.0 if remainder > 1e-12 else 0.0
+    for _ in range(500):
+        odds = {key: np.exp(shifts[key] + z[key]) for key in exclusive}
+        for key in exclusive:
+            others = idle + sum(odds[k] for k in exclusive if k != key)
+            shifts[key] = _fit_shift(z[key], weights, base[key], others)
+            odds[key] = np.exp(shifts[key] + z[key])
+        total = idle + sum(odds.values())
+        rates = {key: odds[key] / total for key in exclusive}
+        if all(abs(np.dot(weights, rates[key]) - base[key]) < tol for key in exclusive):
+            break
+    else:
+        raise ValueError("alpha_r/alpha_i/alpha_d 的目标均值无法同时满足")
+
+    for key in ('beta_d', 'delta'):
+        z_key = _logit_tendency(tendencies[key])
+        rates[key] = 1 / (1 + np.exp(-(_fit_shift(z_key, weights, base[key]) + z_key)))
+
+    cred = profiles['debunk_cred'].to_numpy()
+    cred_mean = np.dot(weights, cred)
+    responsiveness = cred / cred_mean if cred_mean > 0 else np.ones(len(cred))
+    rates['official_mult'] = tuple(1 + (k - 1) * responsiveness for k in official_mult)
+    rates['opinion_mult'] = tuple(1 + (k - 1) * responsiveness for k in opinion_mult)
+    return rates
+
+def sample_node_parameters(N, combo, alpha_i, alpha_r, alpha_d, beta_d, delta,
+                           official_mult=OFFICIAL_MULTIPLIERS, opinion_mult=OPINION_MULTIPLIERS,
+                           demographic_weights=None, seed=None, data_dir=DATA_DIR):
+    """为N个节点有放回地抽取受访者画像，返回可直接传给 rumor_spreading_model 的逐节点参数"""
+    profiles = load_respondent_profiles(combo, data_dir)
+    weights = sampling_weights(profiles, demographic_weights)
+    rates = profile_rates(profiles, weights, alpha_i, alpha_r, alpha_d, beta_d, delta,
+                          official_mult, opinion_mult)
+
+    # 只对受访者下标抽样一次, 各参数按下标整体索引 (无逐节点分支)
+    rng = np.random.default_rng(seed)
+    respondent = rng.choice(len(profiles), size=N, p=weights)
+    params = {key: rates[key][respondent] for key in RATE_KEYS}
+    params['official_mult'] = tuple(k[respondent] for k in rates['official_mult'])
+    params['opinion_mult'] = tuple(k[respondent] for k in rates['opinion_mult'])
+    return params
+
+if __name__ == "__main__":
+    from two_stage import rumor_spreading_model, plot_results
+
+    config = {
+        "N": 5000, "m": 2, "I0": 10, "T": 50, "Td": 10, "D0": 10,
+        "official_ratio": 0.1, "official_layers": 3, "opinion_layers": 2,
+        "alpha_i": 0.1, "alpha_r": 0.8, "alpha_d": 0.1, "beta_d": 0.6, "delta": 0.5
+    }
+    combo = '谣言1_辟谣a'
+
+    # --- 按问卷画像生成逐节点参数 ---
+    config.update(sample_node_parameters(config["N"], combo, *(config[k] for k in RATE_KEYS), seed=0))
+
+    # --- 运行模拟 ---
+    S, I, D, R = rumor_spreading_model(**config)
+    plot_results(S, I, D, R, config["T"], config["Td"], config["official_ratio"], show=True)
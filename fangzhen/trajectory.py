@@ -0,0 +1,115 @@
+import os
+import json
+import numpy as np
+
+# 每步聚合记录: 时间步与 S/I/D/R 节点数
+AGGREGATE_DTYPE = np.dtype([('t', '<i4'), ('S', '<i8'), ('I', '<i8'), ('D', '<i8'), ('R', '<i8')])
+
+def event_dtype(N):
+    """节点状态变化事件记录: (时间步, 节点, 原状态, 新状态)"""
+    return np.dtype([('t', '<i4'), ('node', '<i4' if N < 2**31 else '<i8'), ('old', 'i1'), ('new', 'i1')])
+
+class TrajectoryWriter:
+    """将模拟轨迹逐步追加写入输出目录 (供批量运行使用, 模拟结束后再离线绘图)
+
+    目录结构:
+        meta.json       运行参数 (N, T, Td, official_ratio, 是否记录事件)
+        aggregates.bin  每步一条 AGGREGATE_DTYPE 记录
+        events.bin      (可选) 每个状态变化一条 event_dtype(N) 记录, 按时间步递增
+    每步写完即 flush, 进程中断时已写入的前缀仍可读取。
+    resume_t 不为空时从断点续写: 先校验已有的 meta.json 与本次参数一致, 再丢弃 t > resume_t 的记录后继续追加;
+    目录中尚无聚合记录时新建文件, written_t 为 -1, 由调用方补写断点之前的各步。
+    断点之前的事件无法补写, 因此续写时要求记录事件而原运行未记录, 会抛出 ValueError。
+    meta.json 在所有文件成功打开之后才写入。
+    """
+
+    def __init__(self, directory, N, T, Td, official_ratio, events=False, resume_t=None):
+        self.directory = directory
+        self.event_dtype = event_dtype(N)
+        meta = {"N": N, "T": T, "Td": Td, "official_ratio": official_ratio, "events": events}
+        meta_path = os.path.join(directory, 'meta.json')
+        aggregates_path = os.path.join(directory, 'aggregates.bin')
+        events_path = os.path.join(directory, 'events.bin')
+
+        resuming = resume_t is not None and os.path.exists(aggregates_path)
+        if resume_t is not None and os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                existing = json.load(f)
+            mismatched = [key for key in meta if existing.get(key) != meta[key]]
+            if mismatched:
+                raise ValueError(f"输出目录 {directory} 中的轨迹参数与本次运行不一致: {', '.join(mismatched)}")
+        if resume_t is not None and events and not (resuming and os.path.exists(events_path)):
+            raise ValueError(f"输出目录 {directory} 中没有原运行的事件记录, 无法补写断点之前的事件")
+
+        os.makedirs(directory, exist_ok=True)
+        self._aggregates = open(aggregates_path, 'r+b' if resuming else 'wb')
+        self._events = open(events_path, 'r+b' if resuming else 'wb') if events else None
+        self.written_t = -1
+        if resuming:
+            self._truncate(self._aggregates, AGGREGATE_DTYPE, resume_t)
+            if self._events is not None:
+                self._truncate(self._events, self.event_dtype, resume_t)
+            self.written_t = resume_t
+
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    @staticmethod
+    def _truncate(f, dtype, resume_t):
+        """截断到最后一条 t <= resume_t 的记录 (包括不完整的尾记录)"""
+        n = os.fstat(f.fileno()).st_size // dtype.itemsize
+        records = np.memmap(f, dtype=dtype, mode='r', shape=(n,)) if n else np.zeros(0, dtype)
+        keep = int(np.searchsorted(records['t'], resume_t, side='right'))
+        del records
+        f.truncate(keep * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+
+    def write_step(self, t, counts):
+        """追加第t步的 S/I/D/R 节点数"""
+        record = np.zeros(1, dtype=AGGREGATE_DTYPE)
+        record['t'] = t
+        record['S'], record['I'], record['D'], record['R'] = counts
+        self._aggregates.write(record.tobytes())
+        self._aggregates.flush()
+
+    def write_events(self, t, nodes, old, new):
+        """追加第t步的节点状态变化 (未开启事件记录时忽略)"""
+        if self._events is None or len(nodes) == 0:
+            return
+        records = np.empty(len(nodes), dtype=self.event_dtype)
+        records['t'], records['node'], records['old'], records['new'] = t, nodes, old, new
+        self._events.write(records.tobytes())
+        self._events.flush()
+
+    def close(self):
+        self._aggregates.close()
+        if self._events is not None:
+            self._events.close()
+
+def _read_records(path, dtype):
+    """读取定长记录文件 (忽略中断留下的不完整尾记录)"""
+    n = os.path.getsize(path) // dtype.itemsize
+    return np.fromfile(path, dtype=dtype, count=n)
+
+def load_trajectory(directory):
+    """读取输出目录, 返回 (meta, St, It, Dt, Rt)"""
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    aggregates = _read_records(os.path.join(directory, 'aggregates.bin'), AGGREGATE_DTYPE)
+    N = meta["N"]
+    return (meta,) + tuple(aggregates[key] / N for key in ('S', 'I', 'D', 'R'))
+
+def load_events(directory):
+    """读取节点状态变化事件 (结构化数组, 字段 t/node/old/new)"""
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return _read_records(os.path.join(directory, 'events.bin'), event_dtype(meta["N"]))
+
+if __name__ == "__main__":
+    import sys
+    from two_stage import render_trajectory
+
+    # 用法: python trajectory.py <输出目录> [图片文件名]
+    render_trajectory(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,12 +1,30 @@
 import numpy as np  
-import matplotlib.pyplot as plt  
 import logging  
 import time  
 from datetime import datetime  
 
-# 设置中文字体（解决Matplotlib绘图中文乱码问题）
-plt.rcParams['font.sans-serif'] = ['SimHei']  # 指定默认字体
-plt.rcParams['axes.unicode_minus'] = False  # 解决保存图像是负号'-'显示为方块的问题
+from checkpoint import network_fingerprint, run_signature, save_checkpoint, load_checkpoint  
+from trajectory import TrajectoryWriter, load_trajectory  
+
+# 设置中文字体（解决Matplotlib绘图中文乱码问题）, 只在绘图时局部生效
+PLOT_RC = {
+    'font.sans-serif': ['SimHei'],  # 指定默认字体
+    'axes.unicode_minus': False,  # 解决保存图像是负号'-'显示为方块的问题
+}
+
+def _new_figure(show, figsize):  
+    """按需导入 matplotlib 并创建图 (批量运行的工作进程不绘图时无需付出导入开销)
+    
+    只保存文件时直接使用 Agg 画布, 不经过 pyplot, 也不改变进程的全局后端; show=True 时才使用 pyplot。
+    """
+    if show:  
+        import matplotlib.pyplot as plt  
+        return plt.figure(figsize=figsize)  
+    from matplotlib.figure import Figure  
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  
+    fig = Figure(figsize=figsize)  
+    FigureCanvasAgg(fig)  
+    return fig
 
 def setup_logger():  
     """设置日志处理器"""
@@ -25,91 +43,326 @@ def setup_logger():
     logger.addHandler(console_handler)  
     return logger
 
-def generate_scalefree_network(N, m, logger):  
-    """生成无标度网络 (BA模型)"""
+# 辟谣者影响范围内的概率放大倍数: (alpha_r/beta_d 倍数, alpha_d/delta 倍数)
+OFFICIAL_MULTIPLIERS = (1.5, 1.3)
+OPINION_MULTIPLIERS = (1.3, 1.2)
+# 官方/意见领袖辟谣者相对被转化者的恢复概率系数
+SEED_RECOVERY_FACTOR = 0.3
+
+# 内存布局 (N个节点, E条无向边; BA模型 m=2 时 E≈2N):
+#   网络   indices int32 每条有向边4字节 (每条无向边8字节); indptr 在 2E<2^31 时为int32, 每节点4字节
+#   状态   states 双缓冲 int8 (2字节/节点), debunker_types int8, 辟谣影响范围 int8, ever_spread bool, 共5字节/节点
+#   参数   全局标量为广播视图, 不占内存; 逐节点数组每个8字节/节点 (survey_profiles 共9个, 72字节/节点)
+#   每步   临时数组只与传播者/辟谣者的度之和成正比 (每条活跃边约40字节); 活跃节点筛选与状态计数分块进行,
+#          不分配整网长度的掩码 (每步对整网只有 states 双缓冲之间的一次复制)
+#   合计   标量参数时约 9字节/节点 + 8字节/无向边; N=10^7, m=2 运行期约0.3GB
+#   生成   网络生成时的峰值约 60字节/无向边 (排序去重用的int64键), N=10^7 时约1.2GB
+def _index_dtype(n):  
+    """能容纳 [0, n) 的最小索引类型 (int32 或 int64)"""
+    return np.int32 if n < 2**31 else np.int64
+
+def generate_scalefree_network(N, m, logger, rng=None):  
+    """生成无标度网络 (BA模型)，返回CSR邻接结构 (indptr, indices)"""
     logger.info(f"开始生成无标度网络 (N={N}, m={m})")  
     start_time = time.time()  
-    
-    A = np.zeros((N, N), dtype=int)  
+    rng = np.random.default_rng() if rng is None else rng  
     
     # 初始完全图  
-    for i in range(m + 1):  
-        for j in range(i + 1, m + 1):  
-            A[i, j] = A[j, i] = 1  
-    
-    # 添加剩余节点  
-    for i in range(m + 1, N):  
-        if i % 500 == 0:  
-            logger.info(f"网络生成进度: {i}/{N} 节点 ({(i/N*100):.1f}%)")  
-        
-        degrees = np.sum(A, axis=0)  
-        probs = degrees / np.sum(degrees)  
-        
-        connected = 0  
-        while connected < m:  
-            potential_nodes = np.arange(i)  
-            chosen_node = np.random.choice(potential_nodes, p=probs[:i])  
-            if A[i, chosen_node] == 0:  
-                A[i, chosen_node] = A[chosen_node, i] = 1  
-                connected += 1  
+    src0, dst0 = np.triu_indices(m + 1, k=1)  
+    n0 = len(src0)  
+    
+    # 添加剩余节点: 每条新边在已有边的端点序列中均匀抽取一个位置, 等价于按度优先连接
+    # 端点序列中 2e 位置为边e的起点, 2e+1 位置为边e的终点 (Batagelj-Brandes 算法)
+    node_dtype = _index_dtype(N)  
+    new_src = np.repeat(np.arange(m + 1, N, dtype=node_dtype), m)  
+    first_edge = n0 + (new_src.astype(np.int64) - (m + 1)) * m  
+    pos = (rng.random(len(new_src)) * (2 * first_edge)).astype(np.int64)  
+    del first_edge  
+    
+    src = np.concatenate([src0.astype(node_dtype), new_src])  
+    dst = np.concatenate([dst0.astype(node_dtype), np.full(len(new_src), -1, dtype=node_dtype)])  
+    del new_src  
+    targets = dst[n0:].reshape(-1, m)  # 每行为一个新节点的m个目标 (视图)
+    fresh = np.zeros(len(pos), dtype=bool)  
+    ptr = pos.copy()  
+    pending = np.arange(len(pos))  
+    while pending.size:  
+        # 指向尚未确定的终点时, 沿该边的抽样位置继续回溯 (总是指向更早的边)
+        p = ptr[pending]  
+        edge = p >> 1  
+        val = np.where((p & 1) == 0, src[edge], dst[edge])  
+        done = val >= 0  
+        resolved, val = pending[done], val[done]  
+        dst[n0 + resolved] = val  
+        
+        # 同一新节点的目标重复时重新抽样 (保证连接m个不同节点): 与之前已确定的兄弟边相同,
+        # 或与本轮同时确定、序号更小的兄弟边相同即拒绝; 被拒绝的边在本轮内复位, 不会被其他边回溯读到
+        fresh[resolved] = True  
+        row, col = np.divmod(resolved, m)  
+        siblings = targets[row]  
+        earlier = ~fresh.reshape(-1, m)[row] | (np.arange(m) < col[:, None])  
+        clash = ((siblings == val[:, None]) & earlier & (np.arange(m) != col[:, None])).any(axis=1)  
+        fresh[resolved] = False  
+        rejected = resolved[clash]  
+        dst[n0 + rejected] = -1  
+        pos[rejected] = (rng.random(rejected.size) * (2 * (n0 + rejected // m * m))).astype(np.int64)  
+        
+        ptr[pending[~done]] = pos[edge[~done] - n0]  
+        ptr[rejected] = pos[rejected]  
+        pending = np.concatenate([pending[~done], rejected])  
+    del pos, ptr, fresh, targets  
+    
+    # 对称化并按 (行, 列) 排序得到CSR结构 (新节点的m个目标互不相同, 不存在重复连边)
+    keys = np.concatenate([src.astype(np.int64) * N + dst, dst.astype(np.int64) * N + src])  
+    del src, dst  
+    keys.sort()  
+    indices = (keys % N).astype(node_dtype)  
+    indptr = np.zeros(N + 1, dtype=_index_dtype(len(keys) + 1))  
+    np.cumsum(np.bincount(keys // N, minlength=N), out=indptr[1:])  
     
     elapsed_time = time.time() - start_time  
-    logger.info(f"无标度网络生成完成，耗时: {elapsed_time:.2f}秒")  
-    return A
+    logger.info(f"无标度网络生成完成 (边数={len(indices) // 2})，耗时: {elapsed_time:.2f}秒")  
+    return indptr, indices
 
-def get_influence_range(A, source, layers, logger):  
-    """计算特定节点在网络中的多层影响范围"""
-    N = A.shape[0]  
+def neighbor_edges(indptr, nodes):  
+    """返回一组节点在CSR结构中全部出边的位置"""
+    starts = indptr[nodes].astype(np.int64)  
+    counts = indptr[nodes + 1] - starts  
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)  
+    return offsets + np.arange(counts.sum())
+
+def get_influence_range(indptr, indices, sources, layers):  
+    """计算一组节点在网络中的多层影响范围，返回布尔掩码"""
+    N = len(indptr) - 1  
     is_influenced = np.zeros(N, dtype=bool)  
-    is_influenced[source] = True  
-    current_layer = [source]  
+    is_influenced[sources] = True  
+    current_layer = np.asarray(sources, dtype=np.int64)  
     
     for layer in range(layers):  
         next_layer_mask = np.zeros(N, dtype=bool)  
-        for node in current_layer:  
-            next_layer_mask |= (A[node] > 0)  
+        next_layer_mask[indices[neighbor_edges(indptr, current_layer)]] = True  
         
         next_layer_mask &= ~is_influenced  
         is_influenced |= next_layer_mask  
         current_layer = np.where(next_layer_mask)[0]  
         
-    return np.where(is_influenced)[0]
+    return is_influenced
+
+def _first_hits(owner, hit):  
+    """在按节点排序的候选边中找出每个节点第一条判定成功的边 (等价于逐个邻居判定、成功即break)"""
+    idx = np.flatnonzero(hit)  
+    o = owner[idx]  
+    first = np.ones(len(idx), dtype=bool)  
+    first[1:] = o[1:] != o[:-1]  
+    return idx[first]
+
+def _outgoing(indptr, indices, nodes):  
+    """枚举一组 (升序) 节点的全部出边，返回 (起点, 邻居)，顺序与CSR一致"""
+    edges = neighbor_edges(indptr, nodes)  
+    return np.repeat(nodes, indptr[nodes + 1] - indptr[nodes]), indices[edges]
+
+def _incoming_susceptible(indptr, indices, states, sources):  
+    """从传播源出发枚举指向易感节点的边，返回按 (易感节点, 邻居) 排序的易感节点与节点对编号
+    
+    与逐个遍历所有易感节点的邻居等价, 但只触及传播源 (I/D) 的边。
+    节点对编号为 易感节点*N+邻居, 用于生成该节点对的随机数 (见 _uniforms)。
+    """
+    N = len(states)  
+    src, nbr = _outgoing(indptr, indices, sources)  
+    keep = states[nbr] == 1  
+    keys = _pair_keys(nbr[keep], src[keep], N)  
+    keys.sort()  
+    return keys // N, keys
+
+def _pair_keys(src, nbr, N):  
+    """有向节点对 (节点, 邻居) 的编号"""
+    return src.astype(np.int64) * N + nbr
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+def _mix64(z):  
+    """splitmix64 的输出混合函数 (Python整数版本)"""
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64  
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & _MASK64  
+    return z ^ (z >> 31)
+
+def _uniforms(key, t, stage, pairs):  
+    """计数器式随机数: 由 (随机键, 时间步, 转移类型, 节点对编号) 唯一确定的 [0, 1) 均匀数
+    
+    同一节点对在同一步同一类判定中总是得到同一个随机数, 与抽取顺序及其他节点的状态无关,
+    因此参数不同的两次运行共享随机数 (公共随机数), 状态差异不会打乱后续的抽样。
+    """
+    base = _mix64((key + _mix64(((t << 2) | stage) + 1)) & _MASK64)  
+    z = pairs.astype(np.uint64)  
+    z *= np.uint64(_GOLDEN)  
+    z += np.uint64(base)  
+    z ^= z >> np.uint64(30)  
+    z *= np.uint64(0xBF58476D1CE4E5B9)  
+    z ^= z >> np.uint64(27)  
+    z *= np.uint64(0x94D049BB133111EB)  
+    z ^= z >> np.uint64(31)  
+    z >>= np.uint64(11)  
+    return z * 2.0**-53
+
+def _influence_codes(indptr, indices, off_deb, opi_deb, official_layers, opinion_layers):  
+    """标记官方/领袖影响范围: 0=无, 1=官方, 2=意见领袖 (官方范围优先)"""
+    under_off = get_influence_range(indptr, indices, off_deb, official_layers)  
+    under_opi = get_influence_range(indptr, indices, opi_deb, opinion_layers)  
+    codes = np.zeros(len(under_off), dtype=np.int8)  
+    codes[under_opi] = 2  
+    codes[under_off] = 1  
+    return codes
+
+def _adjusted(rate, nodes, influence, official, opinion):  
+    """按需计算辟谣影响范围内放大后的概率, 避免保存整网的调整后概率数组"""
+    code = influence[nodes]  
+    return rate[nodes] * np.where(code == 1, official[nodes], np.where(code == 2, opinion[nodes], 1.0))
+
+def _tally(states, chunk=1 << 20):  
+    """单次遍历统计 S/I/D/R 节点数 (分块 bincount, 临时数组大小与网络规模无关)"""
+    counts = np.zeros(5, dtype=np.int64)  
+    for start in range(0, len(states), chunk):  
+        counts += np.bincount(states[start:start + chunk], minlength=5)  
+    return counts[1:]
+
+def _active_nodes(states, chunk=1 << 20):  
+    """分块找出传播者与辟谣者 (升序)，返回 (传播者, 辟谣者)，不分配整网长度的临时掩码"""
+    parts = []  
+    for start in range(0, len(states), chunk):  
+        block = states[start:start + chunk]  
+        parts.append(np.flatnonzero((block == 2) | (block == 3)) + start)  
+    active = np.concatenate(parts)  
+    active_states = states[active]  
+    return active[active_states == 2], active[active_states == 3]
+
+def _per_node(value, N):  
+    """将标量或逐节点数组统一为长度N的只读数组"""
+    return np.broadcast_to(np.asarray(value, dtype=float), (N,))
 
 def rumor_spreading_model(N, m, I0, T, Td, D0, official_ratio, official_layers, opinion_layers,   
-                         alpha_i, alpha_r, alpha_d, beta_d, delta):  
-    """两阶段谣言传播主模型"""
+                         alpha_i, alpha_r, alpha_d, beta_d, delta,   
+                         official_mult=OFFICIAL_MULTIPLIERS, opinion_mult=OPINION_MULTIPLIERS, seed=None,   
+                         seed_selector=None, network=None, return_final=False,   
+                         checkpoint_path=None, checkpoint_every=0, resume=False,   
+                         stream_dir=None, stream_events=False, initial_spreaders=None):  
+    """两阶段谣言传播主模型
+    
+    alpha_i/alpha_r/alpha_d/beta_d/delta 以及 official_mult/opinion_mult 中的两个倍数
+    既可以是全局标量，也可以是长度为N的逐节点数组 (见 survey_profiles.sample_node_parameters)。
+    seed_selector 为Td时刻的辟谣者选种函数 (见 seeding.make_seed_selector)，默认按度从高到低选择。
+    network 为已生成的CSR网络 (indptr, indices)，给定时跳过网络生成 (如校准时重复使用同一网络)。
+    initial_spreaders 为指定的初始传播者节点 (须为I0个)，默认随机抽取I0个。
+    return_final=True 时额外返回末态字典 (states, debunker_types, ever_spread)。
+    checkpoint_every>0 时每隔若干步将状态原子写入 checkpoint_path (.npz)，网络在同目录缓存一份;
+    resume=True 时从 checkpoint_path 继续运行 (见 resume_rumor_spreading_model)，运行参数须与断点记录一致。
+    stream_dir 不为空时将每步 S/I/D/R 计数 (stream_events=True 时还有逐节点状态变化事件)
+    追加写入该目录 (见 trajectory.TrajectoryWriter)，之后可用 render_trajectory 离线绘图。
+    状态更新按边向量化: 每个节点对相关邻居逐个判定、首次成功即转变; 每步只枚举传播者/辟谣者的边。
+    每次判定的随机数由 (时间步, 节点, 邻居) 决定 (见 _uniforms)，同一 seed 下不同参数的运行共享随机数。
+    内存布局见文件顶部的说明。
+    """
+    if (checkpoint_every or resume) and checkpoint_path is None:  
+        raise ValueError("checkpoint_every>0 或 resume=True 时必须指定 checkpoint_path")  
+    
     logger = setup_logger()  
     logger.info("开始运行谣言传播模型")  
     logger.info(f"参数: N={N}, I0={I0}, T={T}, Td={Td}, D0={D0}")  
+    rng = np.random.default_rng(seed)  
+    
+    # 断点中记录的运行参数 (恢复时逐项校验; 不使用断点时不计算)
+    signature = None  
+    if checkpoint_every or resume:  
+        signature = run_signature(N=N, m=m, I0=I0, T=T, Td=Td, D0=D0, official_ratio=official_ratio,   
+                                  official_layers=official_layers, opinion_layers=opinion_layers,   
+                                  alpha_i=alpha_i, alpha_r=alpha_r, alpha_d=alpha_d, beta_d=beta_d, delta=delta,   
+                                  official_mult=official_mult, opinion_mult=opinion_mult)  
+    
+    if resume:  
+        start_t, rng, cached_network, saved = load_checkpoint(checkpoint_path, signature)  
+        logger.info(f"从断点恢复: {checkpoint_path} (已完成 {start_t}/{T} 步)")  
+        if network is None:  
+            network = cached_network  
+        elif network_fingerprint(*network) != network_fingerprint(*cached_network):  
+            raise ValueError(f"传入的网络与断点 {checkpoint_path} 记录的网络不一致")  
     
     # 生成网络  
-    A = generate_scalefree_network(N, m, logger)  
+    if network is None:  
+        indptr, indices = generate_scalefree_network(N, m, logger, rng)  
+    else:  
+        indptr, indices = network  
     
-    # 初始化状态: 1=S, 2=I, 3=D, 4=R
-    states = np.ones(N, dtype=int)  
-    initial_spreaders = np.random.choice(N, I0, replace=False)  
-    states[initial_spreaders] = 2  
+    # 逐节点转移概率 (标量广播为数组)
+    alpha_i, alpha_r, alpha_d, beta_d, delta = (_per_node(p, N) for p in (alpha_i, alpha_r, alpha_d, beta_d, delta))  
+    off_r, off_d = (_per_node(p, N) for p in official_mult)  
+    opi_r, opi_d = (_per_node(p, N) for p in opinion_mult)  
+    # 辟谣影响范围: 0=无, 1=官方, 2=意见领袖
+    influence = np.zeros(N, dtype=np.int8)  
     
-    # 辟谣者类型: 1=官方, 2=意见领袖, 3=被转化者
-    debunker_types = np.zeros(N, dtype=int)  
+    if resume:  
+        # 恢复状态数组; 若已过Td, 由官方/领袖辟谣者重新计算影响范围 (与原运行一致)
+        states = saved["states"].astype(np.int8)  
+        debunker_types = saved["debunker_types"].astype(np.int8)  
+        ever_spread = saved["ever_spread"]  
+        crn_key = int(saved["crn_key"])  
+        St, It, Dt, Rt = saved["St"], saved["It"], saved["Dt"], saved["Rt"]  
+        if start_t >= Td:  
+            influence = _influence_codes(indptr, indices, np.flatnonzero(debunker_types == 1),   
+                                         np.flatnonzero(debunker_types == 2), official_layers, opinion_layers)  
+    else:  
+        start_t = 0  
+        
+        # 初始化状态: 1=S, 2=I, 3=D, 4=R
+        states = np.ones(N, dtype=np.int8)  
+        if initial_spreaders is None:  
+            initial_spreaders = rng.choice(N, I0, replace=False)  
+        elif len(initial_spreaders) != I0:  
+            raise ValueError(f"initial_spreaders 须为 I0={I0} 个节点")  
+        states[initial_spreaders] = 2  
+        
+        # 辟谣者类型: 1=官方, 2=意见领袖, 3=被转化者
+        debunker_types = np.zeros(N, dtype=np.int8)  
+        # 曾经成为谣言传播者的节点
+        ever_spread = np.zeros(N, dtype=bool)  
+        ever_spread[initial_spreaders] = True  
+        # 逐节点对随机数的键
+        crn_key = int(rng.integers(2**63))  
+        
+        St, It, Dt, Rt = np.zeros(T + 1), np.zeros(T + 1), np.zeros(T + 1), np.zeros(T + 1)  
+        
+        # 初始比例
+        St[0], It[0], Dt[0], Rt[0] = _tally(states) / N  
     
-    St, It, Dt, Rt = np.zeros(T + 1), np.zeros(T + 1), np.zeros(T + 1), np.zeros(T + 1)  
+    writer = None  
+    if stream_dir is not None:  
+        writer = TrajectoryWriter(stream_dir, N, T, Td, official_ratio, events=stream_events,   
+                                  resume_t=start_t if resume else None)  
+        if not resume:  
+            writer.write_events(0, initial_spreaders, 1, 2)  
+            writer.write_step(0, _tally(states))  
+        else:  
+            # 原运行未写入该目录时, 由断点中保存的比例补写断点之前的各步计数
+            for past_t in range(writer.written_t + 1, start_t + 1):  
+                writer.write_step(past_t, np.rint(np.array([St[past_t], It[past_t], Dt[past_t], Rt[past_t]]) * N).astype(np.int64))  
     
-    # 初始比例
-    St[0], It[0], Dt[0], Rt[0] = np.sum(states==1)/N, np.sum(states==2)/N, np.sum(states==3)/N, np.sum(states==4)/N  
+    # 双缓冲: 下一步状态写入第二个数组, 每步结束时交换, 不再逐步分配
+    new_states = np.empty_like(states)  
     
     D0_official = round(D0 * official_ratio)  
     D0_opinion = D0 - D0_official  
     
     simulation_start_time = time.time()  
-    for t in range(1, T + 1):  
+    for t in range(start_t + 1, T + 1):  
         iteration_start_time = time.time()  
         
-        # Td时刻加入初始辟谣者 (选择度高的节点作为媒体/领袖)
+        # Td时刻加入初始辟谣者 (默认选择度高的节点作为媒体/领袖)
         if t == Td:  
-            degrees = np.sum(A, axis=1)  
-            sorted_indices = np.argsort(-degrees)  
-            available_nodes = sorted_indices[states[sorted_indices] == 1]  
+            if seed_selector is None:  
+                degrees = np.diff(indptr)  
+                sorted_indices = np.argsort(-degrees)  
+                available_nodes = sorted_indices[states[sorted_indices] == 1]  
+            else:  
+                available_nodes = seed_selector(indptr, indices, states, D0)  
             
             off_deb = available_nodes[:min(D0_official, len(available_nodes))]  
             states[off_deb] = 3  
@@ -120,95 +373,132 @@ def rumor_spreading_model(N, m, I0, T, Td, D0, official_ratio, official_layers,
             states[opi_deb] = 3  
             debunker_types[opi_deb] = 2  
             logger.info(f"时间步 {t}: 辟谣者进入 (官方:{len(off_deb)}, 领袖:{len(opi_deb)})")  
+            if writer is not None:  
+                writer.write_events(t, np.concatenate([off_deb, opi_deb]), 1, 3)  
+            
+            # 官方/领袖身份此后不再变化, 影响范围只需计算一次
+            influence = _influence_codes(indptr, indices, off_deb, opi_deb, official_layers, opinion_layers)  
         
-        new_states = np.copy(states)  
+        np.copyto(new_states, states)  
+        spreaders, debunkers = _active_nodes(states)  
+        changed = []  # 本步状态发生变化的节点 (各转移涉及的节点互不重叠)
         
-        # 状态更新逻辑
-        for i in range(N):  
-            neighbors = np.where(A[i])[0]  
+        # 状态更新逻辑 (按边向量化)
+        if t < Td:  # 第一阶段：仅谣言传播
+            # S -> I or R: 逐个传播者邻居判定
+            src, pairs = _incoming_susceptible(indptr, indices, states, spreaders)  
+            r = _uniforms(crn_key, t, 0, pairs)  
+            hit = _first_hits(src, r <= alpha_r[src] + alpha_i[src])  
+            nodes = src[hit]  
+            new_states[nodes] = np.where(r[hit] <= alpha_r[nodes], 4, 2)  
+            ever_spread[nodes[new_states[nodes] == 2]] = True  
+            changed.append(nodes)  
             
-            if t < Td:  # 第一阶段：仅谣言传播
-                if states[i] == 1:  # S -> I or R
-                    for j in neighbors:  
-                        if states[j] == 2:  
-                            r = np.random.rand()  
-                            if r <= alpha_r: new_states[i] = 4; break  
-                            elif r <= alpha_r + alpha_i: new_states[i] = 2; break  
-                elif states[i] == 2:  # I -> R
-                    for j in neighbors:  
-                        if states[j] in [2, 4]:  
-                            if np.random.rand() <= delta: new_states[i] = 4; break  
+            # I -> R: 邻居为传播者或恢复者
+            src, nbr = _outgoing(indptr, indices, spreaders)  
+            nbr_states = states[nbr]  
+            relevant = (nbr_states == 2) | (nbr_states == 4)  
+            src, nbr = src[relevant], nbr[relevant]  
+            hit = _first_hits(src, _uniforms(crn_key, t, 1, _pair_keys(src, nbr, N)) <= delta[src])  
+            new_states[src[hit]] = 4  
+            changed.append(src[hit])  
+        
+        else:  # 第二阶段：加入辟谣干预
+            # S -> R, I or D: 邻居为传播者或辟谣者
+            src, pairs = _incoming_susceptible(indptr, indices, states, np.concatenate([spreaders, debunkers]))  
+            r = _uniforms(crn_key, t, 0, pairs)  
+            l_alpha_r = _adjusted(alpha_r, src, influence, off_r, opi_r)  
+            l_alpha_d = _adjusted(alpha_d, src, influence, off_d, opi_d)  
+            hit = _first_hits(src, r <= l_alpha_r + alpha_i[src] + l_alpha_d)  
+            nodes, r = src[hit], r[hit]  
+            l_alpha_r = l_alpha_r[hit]  
+            new_states[nodes] = np.select([r <= l_alpha_r, r <= l_alpha_r + alpha_i[nodes]], [4, 2], 3)  
+            debunker_types[nodes[new_states[nodes] == 3]] = 3  
+            ever_spread[nodes[new_states[nodes] == 2]] = True  
+            changed.append(nodes)  
             
-            else:  # 第二阶段：加入辟谣干预
-                if states[i] == 1:  
-                    under_off = any(i in get_influence_range(A, od, official_layers, logger) for od in np.where(debunker_types == 1)[0])
-                    under_opi = False
-                    if not under_off:
-                        under_opi = any(i in get_influence_range(A, ol, opinion_layers, logger) for ol in np.where(debunker_types == 2)[0])
-                    
-                    l_alpha_r, l_alpha_d = alpha_r, alpha_d  
-                    if under_off: l_alpha_r *= 1.5; l_alpha_d *= 1.3  
-                    elif under_opi: l_alpha_r *= 1.3; l_alpha_d *= 1.2  
-                    
-                    for j in neighbors:  
-                        if states[j] in [2, 3]:  
-                            r = np.random.rand()  
-                            if r <= l_alpha_r: new_states[i] = 4; break  
-                            elif r <= l_alpha_r + alpha_i: new_states[i] = 2; break  
-                            elif r <= l_alpha_r + alpha_i + l_alpha_d: 
-                                new_states[i] = 3; debunker_types[i] = 3; break  
-                
-                elif states[i] == 2:  
-                    # 检查是否在干预范围内并调整转化概率 (逻辑同上)
-                    under_off = any(i in get_influence_range(A, od, official_layers, logger) for od in np.where(debunker_types == 1)[0])
-                    under_opi = False if under_off else any(i in get_influence_range(A, ol, opinion_layers, logger) for ol in np.where(debunker_types == 2)[0])
-                    
-                    l_beta_d, l_delta = beta_d, delta  
-                    if under_off: l_beta_d *= 1.5; l_delta *= 1.3  
-                    elif under_opi: l_beta_d *= 1.3; l_delta *= 1.2  
-                    
-                    for j in neighbors:  
-                        if states[j] == 3:  
-                            if np.random.rand() <= l_beta_d: new_states[i] = 3; debunker_types[i] = 3; break  
-                        elif states[j] in [2, 3, 4]:  
-                            if np.random.rand() <= l_delta: new_states[i] = 4; break  
-                
-                elif states[i] == 3:  
-                    if debunker_types[i] > 0:  
-                        for j in neighbors:  
-                            if states[j] in [2, 3, 4]:  
-                                prob = delta if debunker_types[i] == 3 else delta * 0.3
-                                if np.random.rand() <= prob: new_states[i] = 4; break  
-        
-        states = new_states  
-        St[t], It[t], Dt[t], Rt[t] = np.sum(states==1)/N, np.sum(states==2)/N, np.sum(states==3)/N, np.sum(states==4)/N  
+            # I -> D (辟谣者邻居) or R (传播者/恢复者邻居)
+            src, nbr = _outgoing(indptr, indices, spreaders)  
+            nbr_states = states[nbr]  
+            relevant = nbr_states >= 2  
+            src, nbr, by_debunker = src[relevant], nbr[relevant], nbr_states[relevant] == 3  
+            prob = np.where(by_debunker, _adjusted(beta_d, src, influence, off_r, opi_r),   
+                            _adjusted(delta, src, influence, off_d, opi_d))  
+            hit = _first_hits(src, _uniforms(crn_key, t, 1, _pair_keys(src, nbr, N)) <= prob)  
+            nodes = src[hit]  
+            new_states[nodes] = np.where(by_debunker[hit], 3, 4)  
+            debunker_types[nodes[by_debunker[hit]]] = 3  
+            changed.append(nodes)  
+            
+            # D -> R: 官方/领袖辟谣者恢复概率较低
+            src, nbr = _outgoing(indptr, indices, debunkers[debunker_types[debunkers] > 0])  
+            relevant = states[nbr] >= 2  
+            src, nbr = src[relevant], nbr[relevant]  
+            prob = np.where(debunker_types[src] == 3, delta[src], delta[src] * SEED_RECOVERY_FACTOR)  
+            hit = _first_hits(src, _uniforms(crn_key, t, 2, _pair_keys(src, nbr, N)) <= prob)  
+            new_states[src[hit]] = 4  
+            changed.append(src[hit])  
+        
+        states, new_states = new_states, states  
+        counts = _tally(states)  
+        St[t], It[t], Dt[t], Rt[t] = counts / N  
+        
+        if writer is not None:  
+            if stream_events:  
+                changed = np.sort(np.concatenate(changed))  
+                writer.write_events(t, changed, new_states[changed], states[changed])  
+            writer.write_step(t, counts)  
         
         if t % 5 == 0:
             logger.info(f"时间步 {t}/{T} 完成 | S:{St[t]:.3f} I:{It[t]:.3f} D:{Dt[t]:.3f} R:{Rt[t]:.3f}")  
+        
+        if checkpoint_every and t % checkpoint_every == 0 and t < T:  
+            save_checkpoint(checkpoint_path, t, rng, indptr, indices, signature, states=states, debunker_types=debunker_types,   
+                            ever_spread=ever_spread, St=St, It=It, Dt=Dt, Rt=Rt, crn_key=crn_key)  
     
     logger.info(f"模拟完成，总耗时: {time.time() - simulation_start_time:.2f}秒")  
+    if writer is not None:  
+        writer.close()  
+    if return_final:  
+        return St, It, Dt, Rt, {"states": states, "debunker_types": debunker_types, "ever_spread": ever_spread}  
     return St, It, Dt, Rt
 
-def plot_results(St, It, Dt, Rt, T, Td, official_ratio):  
-    """绘制传播趋势图"""
-    plt.figure(figsize=(10, 6))  
-    plt.plot(range(T + 1), St, '-*', label='易感者(S)')  
-    plt.plot(range(T + 1), It, '-d', label='谣言传播者(I)')  
-    plt.plot(range(T + 1), Dt, '-^', label=f'辟谣者(D)\n官方:{100*official_ratio:.0f}% 领袖:{100*(1-official_ratio):.0f}%')  
-    plt.plot(range(T + 1), Rt, '-p', label='已恢复者(R)')  
-    plt.axvline(x=Td, color='r', linestyle='--', label='辟谣者进入时间')  
-    plt.xlabel('时间')  
-    plt.ylabel('比例')  
-    plt.title('两阶段谣言传播模型模拟结果')  
-    plt.legend(loc='best')  
-    plt.grid(True)  
-    plt.tight_layout()  
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')  
-    filename = f'rumor_model_result_{timestamp}.png'
-    plt.savefig(filename)  
-    print(f"图表已保存为: {filename}")
-    plt.show()
+def resume_rumor_spreading_model(checkpoint_path, **config):  
+    """从断点继续运行模型 (config 须与原运行相同, 否则抛出 ValueError)，结果与不中断的运行逐位一致"""
+    return rumor_spreading_model(**config, checkpoint_path=checkpoint_path, resume=True)
+
+def plot_results(St, It, Dt, Rt, T, Td, official_ratio, filename=None, show=False):  
+    """绘制传播趋势图 (默认直接以Agg画布保存为PNG; show=True 时经 pyplot 弹出窗口)"""
+    import matplotlib  
+    with matplotlib.rc_context(PLOT_RC):  
+        fig = _new_figure(show, figsize=(10, 6))  
+        ax = fig.add_subplot()  
+        ax.plot(range(T + 1), St, '-*', label='易感者(S)')  
+        ax.plot(range(T + 1), It, '-d', label='谣言传播者(I)')  
+        ax.plot(range(T + 1), Dt, '-^', label=f'辟谣者(D)\n官方:{100*official_ratio:.0f}% 领袖:{100*(1-official_ratio):.0f}%')  
+        ax.plot(range(T + 1), Rt, '-p', label='已恢复者(R)')  
+        ax.axvline(x=Td, color='r', linestyle='--', label='辟谣者进入时间')  
+        ax.set_xlabel('时间')  
+        ax.set_ylabel('比例')  
+        ax.set_title('两阶段谣言传播模型模拟结果')  
+        ax.legend(loc='best')  
+        ax.grid(True)  
+        fig.tight_layout()  
+        
+        if filename is None:  
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')  
+            filename = f'rumor_model_result_{timestamp}.png'
+        fig.savefig(filename)  
+        print(f"图表已保存为: {filename}")
+        if show:  
+            import matplotlib.pyplot as plt  
+            plt.show()  
+            plt.close(fig)
+
+def render_trajectory(stream_dir, filename=None):  
+    """从 stream_dir 中保存的轨迹绘图 (可在模拟结束后批量离线渲染)"""
+    meta, St, It, Dt, Rt = load_trajectory(stream_dir)  
+    plot_results(St, It, Dt, Rt, len(St) - 1, meta["Td"], meta["official_ratio"], filename=filename)
 
 if __name__ == "__main__":
     # --- 参数配置 ---
@@ -233,4 +523,4 @@ if __name__ == "__main__":
     S, I, D, R = rumor_spreading_model(**config)
 
     # --- 绘图 ---
-    plot_results(S, I, D, R, config["T"], config["Td"], config["official_ratio"])
\ No newline at end of file
+    plot_results(S, I, D, R, config["T"], config["Td"], config["official_ratio"], show=True)
\ No newline at end of file